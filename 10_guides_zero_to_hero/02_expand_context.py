@@ -28,13 +28,30 @@ Notes:
 
 ```python
 import os
+import re
 import json
 import time
+import atexit
+import asyncio
+import hashlib
+import heapq
 import tiktoken  # OpenAI's tokenizer
-import numpy as np
 import matplotlib.pyplot as plt
+from array import array
+from collections import Counter
 from typing import Dict, List, Tuple, Any, Optional, Union
 
+# orjson serializes to bytes several times faster than the stdlib encoder;
+# fall back to json if it isn't installed
+try:
+    import orjson
+
+    def dump_json(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def dump_json(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2).encode("utf-8")
+
 # Load environment variables
 import dotenv
 dotenv.load_dotenv()
@@ -43,28 +60,91 @@ dotenv.load_dotenv()
 USE_OPENAI = True  # Set to False to use another provider
 
 if USE_OPENAI:
-    from openai import OpenAI
-    client = OpenAI()
+    import httpx
+    from openai import OpenAI, AsyncOpenAI
+
+    # Pooled HTTP/2 transports shared by every LLM call in the notebook.
+    # Keep-alive connections skip repeated TLS handshakes, and HTTP/2
+    # multiplexes the async fan-outs over a single connection.
+    _limits = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+    _http_client = httpx.Client(http2=True, limits=_limits)
+    client = OpenAI(http_client=_http_client)
+
+    # Async transports (and semaphores) bind to the event loop they first
+    # run on, and this notebook enters the loop through asyncio.run more
+    # than once — a transport created at import would resurface keep-alive
+    # connections from a closed loop. Build them lazily per running loop.
+    _async_state: Dict[int, Tuple[Any, asyncio.Semaphore, Any]] = {}
+
+    def _get_async_client() -> Tuple[Any, asyncio.Semaphore]:
+        """Return the AsyncOpenAI client and request semaphore for the running loop."""
+        loop_id = id(asyncio.get_running_loop())
+        if loop_id not in _async_state:
+            transport = httpx.AsyncClient(http2=True, limits=_limits)
+            _async_state[loop_id] = (
+                AsyncOpenAI(http_client=transport),
+                asyncio.Semaphore(16),  # cap in-flight requests for rate limits
+                transport,
+            )
+        async_client, semaphore, _ = _async_state[loop_id]
+        return async_client, semaphore
+
+    def _close_transports() -> None:
+        """Release pooled connections at interpreter exit."""
+        _http_client.close()
+        for _, _, transport in _async_state.values():
+            try:
+                asyncio.run(transport.aclose())
+            except RuntimeError:
+                pass  # the transport's loop already tore its connections down
+
+    atexit.register(_close_transports)
+
     MODEL = "gpt-3.5-turbo"  # Can be changed to gpt-4 or other models
 else:
     # Add alternative API client setup here
     pass
 
-# Token counter setup
+# Token counter setup: resolve the Encoding once and reuse it everywhere.
+# encoding_for_model is surprisingly expensive, so never call it per-text.
 tokenizer = tiktoken.encoding_for_model(MODEL) if USE_OPENAI else None
 
+# Fallback approximation: split text into the word/number/punctuation pieces
+# a byte-pair pre-tokenizer would see. Compiled once at module scope.
+_BPE_PIECE_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+def _approximate_token_count(text: str) -> int:
+    """Estimate a BPE token count without a tokenizer.
+
+    Each short piece is roughly one token; longer pieces get split by BPE
+    about every four bytes. Tracks tiktoken far closer than the old
+    words * 1.3 heuristic, and returns an int rather than a float.
+    """
+    return sum(
+        1 + (len(piece.encode("utf-8")) - 1) // 4
+        for piece in _BPE_PIECE_PATTERN.findall(text)
+    )
+
 def count_tokens(text: str) -> int:
-    """Count tokens in a string using the appropriate tokenizer."""
+    """Count tokens in a string using the cached tokenizer."""
     if tokenizer:
-        return len(tokenizer.encode(text))
+        # encode_ordinary skips the special-token regex pass, which is all
+        # we need for plain prompt/response text
+        return len(tokenizer.encode_ordinary(text))
     # Fallback for non-OpenAI models
-    return len(text.split()) * 1.3  # Rough approximation
+    return _approximate_token_count(text)
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Count tokens for many strings in one pass over the tokenizer."""
+    if tokenizer:
+        return [len(ids) for ids in tokenizer.encode_ordinary_batch(texts)]
+    return [count_tokens(text) for text in texts]
 
 def measure_latency(func, *args, **kwargs) -> Tuple[Any, float]:
     """Measure execution time of a function."""
-    start_time = time.time()
+    start_time = time.perf_counter()
     result = func(*args, **kwargs)
-    return result, time.time() - start_time
+    return result, time.perf_counter() - start_time
 ```
 
 ---
@@ -72,33 +152,141 @@ def measure_latency(func, *args, **kwargs) -> Tuple[Any, float]:
 ## 1. Understanding Context Expansion
 
 ```python
-def calculate_metrics(prompt: str, response: str, latency: float) -> Dict[str, float]:
-    """Calculate key metrics for a prompt-response pair."""
-    prompt_tokens = count_tokens(prompt)
-    response_tokens = count_tokens(response)
-    
+def calculate_metrics(
+    prompt: str,
+    response: str,
+    latency: float,
+    prompt_tokens: Optional[int] = None,
+    response_tokens: Optional[int] = None,
+    ttft: Optional[float] = None
+) -> Dict[str, float]:
+    """Calculate key metrics for a prompt-response pair.
+
+    Token counts may be passed in when the caller has already batch-tokenized
+    the texts; otherwise they are computed here. Streaming callers can supply
+    ttft (time to first token), which is included when present.
+    """
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt)
+    if response_tokens is None:
+        response_tokens = count_tokens(response)
+
     token_efficiency = response_tokens / prompt_tokens if prompt_tokens > 0 else 0
     latency_per_1k = (latency / prompt_tokens) * 1000 if prompt_tokens > 0 else 0
-    
-    return {
+
+    metrics = {
         "prompt_tokens": prompt_tokens,
         "response_tokens": response_tokens,
         "token_efficiency": token_efficiency,
         "latency": latency,
         "latency_per_1k": latency_per_1k
     }
-
-def generate_response(prompt: str) -> Tuple[str, float]:
-    """Generate a response from the LLM and measure latency."""
+    if ttft is not None:
+        metrics["ttft"] = ttft
+    return metrics
+
+# Responses keyed by prompt hash. Experiments like test_layered_contexts
+# revisit the same prompt (e.g. the bare base prompt) across configurations;
+# caching turns those repeats into dictionary lookups instead of LLM calls.
+_response_cache: Dict[str, Tuple[str, float]] = {}
+
+def _prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def generate_response(prompt: str, use_cache: bool = True) -> Tuple[str, float]:
+    """Generate a response from the LLM and measure latency.
+
+    With use_cache enabled, identical prompts are served from the in-memory
+    cache (with the latency of the original call) and the call runs at
+    temperature 0 so the cached completion is the deterministic one. Pass
+    use_cache=False when sampling variability matters.
+    """
     if USE_OPENAI:
-        start_time = time.time()
+        key = _prompt_key(prompt)
+        if use_cache and key in _response_cache:
+            return _response_cache[key]
+        start_time = time.perf_counter()
         response = client.chat.completions.create(
             model=MODEL,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
+            temperature=0.0 if use_cache else 0.7,
             max_tokens=500
         )
-        return response.choices[0].message.content, time.time() - start_time
+        result = response.choices[0].message.content, time.perf_counter() - start_time
+        if use_cache:
+            _response_cache[key] = result
+        return result
+    else:
+        pass
+
+async def generate_response_async(prompt: str, use_cache: bool = True) -> Tuple[str, float]:
+    """Async variant of generate_response, for issuing many requests concurrently.
+
+    Shares _response_cache (and its temperature-0 caching contract) with the
+    sync path, so batched sweeps that revisit a prompt skip the request too.
+    The client and rate-limit semaphore come from _get_async_client, scoped
+    to the running event loop.
+    """
+    if USE_OPENAI:
+        key = _prompt_key(prompt)
+        if use_cache and key in _response_cache:
+            return _response_cache[key]
+        async_client, semaphore = _get_async_client()
+        async with semaphore:
+            start_time = time.perf_counter()
+            response = await async_client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.0 if use_cache else 0.7,
+                max_tokens=500
+            )
+            result = response.choices[0].message.content, time.perf_counter() - start_time
+        if use_cache:
+            _response_cache[key] = result
+        return result
+    else:
+        pass
+
+async def generate_responses_batch(prompts: Dict[str, str], use_cache: bool = True) -> Dict[str, Tuple[str, float]]:
+    """Fan out one async call per prompt and gather them in a single event-loop pass."""
+    names = list(prompts.keys())
+    outputs = await asyncio.gather(
+        *(generate_response_async(prompts[name], use_cache=use_cache) for name in names)
+    )
+    return dict(zip(names, outputs))
+
+def generate_response_streaming(prompt: str) -> Tuple[str, float, float, int]:
+    """Stream a response, capturing time-to-first-token and tokenizing chunks as they arrive.
+
+    Streaming makes TTFT — how long the user stares at nothing — observable,
+    which total latency alone hides. Tokenizing each delta while the next is
+    still in flight also overlaps tokenization with network time, so the
+    token count is ready the moment the stream closes. Per-chunk counts can
+    differ from a whole-text count by a token or two at chunk boundaries,
+    which is fine for cost tracking.
+    Returns (response_text, latency, ttft, response_tokens).
+    """
+    if USE_OPENAI:
+        start_time = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+        chunks = []
+        response_tokens = 0
+        ttft = None
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if ttft is None:
+                    ttft = time.perf_counter() - start_time
+                chunks.append(delta)
+                response_tokens += count_tokens(delta)
+        latency = time.perf_counter() - start_time
+        return "".join(chunks), latency, ttft if ttft is not None else latency, response_tokens
     else:
         pass
 ```
@@ -110,9 +298,23 @@ def generate_response(prompt: str) -> Tuple[str, float]:
 ```python
 base_prompt = "Write a paragraph about climate change."
 
+# Static context shared by the richer variants. Keeping this block identical
+# and placing it at the *start* of each prompt lets provider-side prompt
+# caching reuse the prefix across calls instead of re-processing it each time.
+STATIC_PREFIX = """You are an environmental scientist.
+
+Guidelines:
+- Include at least one scientific fact
+- Mention both causes and effects
+- End with a call to action
+
+Example tone:
+"Ocean acidification occurs when seawater absorbs CO2 from the atmosphere, causing pH levels to drop. Since the Industrial Revolution, ocean pH has decreased by 0.1 units."
+"""
+
 expanded_prompts = {
     "base": base_prompt,
-    "with_role": """You are an environmental scientist. 
+    "with_role": """You are an environmental scientist.
 Write a paragraph about climate change.""",
     "with_examples": """Write a paragraph about climate change.
 
@@ -125,30 +327,45 @@ Global climate change is evident in the increasing frequency of extreme weather
 - Include at least one scientific fact
 - Mention both causes and effects
 - End with a call to action""",
-    "with_audience": """Write a paragraph about climate change for high school students 
+    "with_audience": """Write a paragraph about climate change for high school students
 just beginning to learn about environmental science.""",
-    "comprehensive": """You are an environmental scientist.
-
-Write a paragraph about climate change for high school students just beginning to learn about environmental science.
-
-Guidelines:
-- Include at least one scientific fact
-- Mention both causes and effects
-- End with a call to action
-
-Example tone:
-"Ocean acidification occurs when seawater absorbs CO2 from the atmosphere, causing pH levels to drop. Since the Industrial Revolution, ocean pH has decreased by 0.1 units."
-"""
+    # Static prefix first, variable task last: only the suffix misses the cache.
+    "comprehensive": f"""{STATIC_PREFIX}
+Write a paragraph about climate change for high school students just beginning to learn about environmental science.""",
 }
 
 results = {}
 responses = {}
 
-for name, prompt in expanded_prompts.items():
-    print(f"Testing prompt: {name}")
-    response, latency = generate_response(prompt)
+# Issue all prompt variants concurrently rather than one blocking call at a time.
+# (In Jupyter, replace asyncio.run(...) with a top-level `await`.)
+batch_outputs = asyncio.run(generate_responses_batch(expanded_prompts))
+
+# Tokenize prompts and responses alike in one batch pass each, then hand the
+# counts to calculate_metrics so nothing is tokenized twice
+names = list(expanded_prompts.keys())
+prompt_counts = count_tokens_batch([expanded_prompts[n] for n in names])
+response_counts = count_tokens_batch([batch_outputs[n][0] for n in names])
+
+for name, p_tokens, r_tokens in zip(names, prompt_counts, response_counts):
+    response, latency = batch_outputs[name]
     responses[name] = response
-    results[name] = calculate_metrics(prompt, response, latency)
+    results[name] = calculate_metrics(
+        expanded_prompts[name], response, latency,
+        prompt_tokens=p_tokens, response_tokens=r_tokens
+    )
+
+# Stream the richest variant once to see time-to-first-token: for a user
+# watching output appear, TTFT matters more than total latency.
+stream_response, stream_latency, stream_ttft, stream_tokens = generate_response_streaming(
+    expanded_prompts["comprehensive"]
+)
+stream_metrics = calculate_metrics(
+    expanded_prompts["comprehensive"], stream_response, stream_latency,
+    response_tokens=stream_tokens, ttft=stream_ttft
+)
+print(f"Streaming 'comprehensive': first token after {stream_metrics['ttft']:.2f}s "
+      f"of {stream_metrics['latency']:.2f}s total")
 ```
 
 ---
@@ -157,25 +374,43 @@ for name, prompt in expanded_prompts.items():
 
 ```python
 prompt_types = list(results.keys())
-prompt_tokens = [results[k]['prompt_tokens'] for k in prompt_types]
-response_tokens = [results[k]['response_tokens'] for k in prompt_types]
-latencies = [results[k]['latency'] for k in prompt_types]
 
-fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-
-axes[0, 0].bar(prompt_types, prompt_tokens, label='Prompt Tokens', alpha=0.7, color='blue')
-axes[0, 0].bar(prompt_types, response_tokens, bottom=prompt_tokens, label='Response Tokens', alpha=0.7, color='green')
-axes[0, 0].set_title('Token Usage by Prompt Type')
-axes[0, 0].legend()
+# Assemble all plotting series in one pass over results. These are half a
+# dozen floats per metric, so compact stdlib array('d') vectors do the job
+# without pulling NumPy into the notebook at all.
+METRIC_FIELDS = ['prompt_tokens', 'response_tokens', 'token_efficiency', 'latency', 'latency_per_1k']
+metrics = {
+    f: array('d', (results[k][f] for k in prompt_types)) for f in METRIC_FIELDS
+}
 
-axes[0, 1].bar(prompt_types, [results[k]['token_efficiency'] for k in prompt_types], color='purple', alpha=0.7)
-axes[0, 1].set_title('Token Efficiency (Response/Prompt)')
+# Numeric category positions, computed once and shared by every panel.
+# Matplotlib resolves string categories per bar call; passing precomputed
+# positions keeps each panel down to a single Axes.bar call.
+n = len(prompt_types)
+x = list(range(n))
 
-axes[1, 0].bar(prompt_types, latencies, color='red', alpha=0.7)
-axes[1, 0].set_title('Response Latency')
+fig, axes = plt.subplots(2, 2, figsize=(14, 10))
 
-axes[1, 1].bar(prompt_types, [results[k]['latency_per_1k'] for k in prompt_types], color='orange', alpha=0.7)
-axes[1, 1].set_title('Latency per 1k Tokens')
+# Token usage as grouped bars in one call: prompt bars at x-0.2, response
+# bars at x+0.2, heights and colors concatenated to match.
+axes[0, 0].bar(
+    [i - 0.2 for i in x] + [i + 0.2 for i in x],
+    metrics['prompt_tokens'] + metrics['response_tokens'],
+    width=0.4, alpha=0.7, color=['blue'] * n + ['green'] * n
+)
+axes[0, 0].set_title('Token Usage by Prompt Type (blue=prompt, green=response)')
+
+for ax, field, title, color in [
+    (axes[0, 1], 'token_efficiency', 'Token Efficiency (Response/Prompt)', 'purple'),
+    (axes[1, 0], 'latency', 'Response Latency', 'red'),
+    (axes[1, 1], 'latency_per_1k', 'Latency per 1k Tokens', 'orange'),
+]:
+    ax.bar(x, metrics[field], color=color, alpha=0.7)
+    ax.set_title(title)
+
+for ax in axes.flat:
+    ax.set_xticks(x)
+    ax.set_xticklabels(prompt_types)
 
 plt.tight_layout()
 plt.show()
@@ -190,6 +425,10 @@ for name, response in responses.items():
     print(f"\n=== Response for {name} prompt ===\n")
     print(response)
     print("\n" + "=" * 80 + "\n")
+
+# Persist the run for later comparison (orjson-backed, see setup)
+with open("context_expansion_results.json", "wb") as f:
+    f.write(dump_json({"results": results, "responses": responses}))
 ```
 
 ---
@@ -197,43 +436,76 @@ for name, response in responses.items():
 ## 5. Context Expansion Patterns
 
 ```python
-def create_expanded_context(
-    base_prompt: str, 
-    role: Optional[str] = None,
-    examples: Optional[List[str]] = None,
-    constraints: Optional[List[str]] = None,
-    audience: Optional[str] = None,
-    tone: Optional[str] = None,
-    output_format: Optional[str] = None
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def _build_expanded_context(
+    base_prompt: str,
+    role: Optional[str],
+    examples: Optional[Tuple[str, ...]],
+    constraints: Optional[Tuple[str, ...]],
+    audience: Optional[str],
+    tone: Optional[str],
+    output_format: Optional[str]
 ) -> str:
-    """Create an expanded context from a base prompt with optional components."""
+    """Assemble the expanded context; memoized on the full argument tuple.
+
+    The static components come first and the base prompt goes last, so
+    sweeps that vary only the base prompt share an identical prefix and get
+    provider-side prompt-cache reuse (see the STATIC_PREFIX note above).
+    """
     context_parts = []
-    
+
     if role:
         context_parts.append(f"You are {role}.")
-    
-    context_parts.append(base_prompt)
-    
+
     if audience:
         context_parts.append(f"Your response should be suitable for {audience}.")
-    
+
     if tone:
         context_parts.append(f"Use a {tone} tone in your response.")
-    
+
     if output_format:
         context_parts.append(f"Format your response as {output_format}.")
-    
+
     if constraints:
         context_parts.append("Requirements:")
         for constraint in constraints:
             context_parts.append(f"- {constraint}")
-    
+
     if examples:
         context_parts.append("Examples:")
         for i, example in enumerate(examples, 1):
             context_parts.append(f"Example {i}:\n{example}")
-    
+
+    context_parts.append(base_prompt)
+
     return "\n\n".join(context_parts)
+
+def create_expanded_context(
+    base_prompt: str,
+    role: Optional[str] = None,
+    examples: Optional[List[str]] = None,
+    constraints: Optional[List[str]] = None,
+    audience: Optional[str] = None,
+    tone: Optional[str] = None,
+    output_format: Optional[str] = None
+) -> str:
+    """Create an expanded context from a base prompt with optional components.
+
+    Repeated calls with the same arguments (common when sweeping layer
+    combinations) hit the memoized builder instead of re-joining strings.
+    The list arguments are frozen to tuples so the cache key is hashable.
+    """
+    return _build_expanded_context(
+        base_prompt,
+        role,
+        tuple(examples) if examples else None,
+        tuple(constraints) if constraints else None,
+        audience,
+        tone,
+        output_format
+    )
 ```
 
 ---
@@ -241,26 +513,33 @@ def create_expanded_context(
 ## 6. Advanced Context Expansion: Layer Optimization
 
 ```python
-def test_layered_contexts(base_prompt: str, context_layers: Dict[str, str]) -> Dict[str, Dict]:
-    """Test different combinations of context layers to find optimal configurations."""
-    layer_results = {}
-    
-    # Test base prompt alone
-    base_response, base_latency = generate_response(base_prompt)
-    layer_results["base"] = calculate_metrics(base_prompt, base_response, base_latency)
-    
-    # Test each layer individually added to base
+async def test_layered_contexts(base_prompt: str, context_layers: Dict[str, str]) -> Dict[str, Dict]:
+    """Test different combinations of context layers to find optimal configurations.
+
+    All combinations — base alone, base plus each layer, and all layers
+    together — are built up front and sent as one concurrent batch, so the
+    sweep takes roughly one round trip instead of one per configuration.
+    """
+    combination_prompts = {"base": base_prompt}
     for layer_name, layer_content in context_layers.items():
-        combined_prompt = f"{base_prompt}\n\n{layer_content}"
-        response, latency = generate_response(combined_prompt)
-        layer_results[f"base+{layer_name}"] = calculate_metrics(combined_prompt, response, latency)
-    
-    # Test all layers combined
+        combination_prompts[f"base+{layer_name}"] = f"{base_prompt}\n\n{layer_content}"
     all_layers = "\n\n".join(context_layers.values())
-    full_prompt = f"{base_prompt}\n\n{all_layers}"
-    full_response, full_latency = generate_response(full_prompt)
-    layer_results["all_layers"] = calculate_metrics(full_prompt, full_response, full_latency)
-    
+    combination_prompts["all_layers"] = f"{base_prompt}\n\n{all_layers}"
+
+    batch_outputs = await generate_responses_batch(combination_prompts)
+
+    # Tokenize every prompt and response in two batch passes
+    names = list(combination_prompts.keys())
+    prompt_counts = count_tokens_batch([combination_prompts[n] for n in names])
+    response_counts = count_tokens_batch([batch_outputs[n][0] for n in names])
+
+    layer_results = {}
+    for name, p_tokens, r_tokens in zip(names, prompt_counts, response_counts):
+        response, latency = batch_outputs[name]
+        layer_results[name] = calculate_metrics(
+            combination_prompts[name], response, latency,
+            prompt_tokens=p_tokens, response_tokens=r_tokens
+        )
     return layer_results
 ```
 
@@ -269,30 +548,55 @@ def test_layered_contexts(base_prompt: str, context_layers: Dict[str, str]) -> D
 ## 7. Context Compression Techniques
 
 ```python
-def compress_context(context: str, technique: str = 'summarize') -> str:
-    """Apply different compression techniques to reduce token usage while preserving meaning."""
-    if technique == 'summarize':
-        prompt = f"""Summarize the following context in a concise way that preserves all key information:
-{context}"""
-        compressed, _ = generate_response(prompt)
-        return compressed
-    
-    elif technique == 'keywords':
-        prompt = f"""Extract the most important keywords and phrases from this context:
-{context}
-Format your response as a comma-separated list."""
-        keywords, _ = generate_response(prompt)
-        return keywords
-    
-    elif technique == 'bullet':
-        prompt = f"""Convert this context into a concise list of bullet points that
-captures all essential information:
+# Per-technique instructions, shared by the single- and multi-output paths
+COMPRESSION_INSTRUCTIONS = {
+    'summarize': "Summarize the context in a concise way that preserves all key information.",
+    'keywords': "Extract the most important keywords and phrases as a comma-separated list.",
+    'bullet': "Convert the context into a concise list of bullet points that captures all essential information.",
+}
+
+def compress_context_multi(context: str, techniques: List[str]) -> Dict[str, str]:
+    """Produce several compressed views of a context with one fused LLM call.
+
+    The context is sent once with all requested instructions, so the model
+    reads it a single time instead of once per technique. Outputs come back
+    under labeled headers and are split apart locally.
+    """
+    requested = [t for t in techniques if t in COMPRESSION_INSTRUCTIONS]
+    if not requested:
+        return {}
+
+    sections = "\n".join(
+        f"### {t.upper()}\n{COMPRESSION_INSTRUCTIONS[t]}" for t in requested
+    )
+    prompt = f"""Apply each of the following compression techniques to the context below.
+Answer each one under its own header, exactly as given (e.g. ### SUMMARIZE).
+
+{sections}
+
+Context:
 {context}"""
-        bullets, _ = generate_response(prompt)
-        return bullets
-    
-    else:
+    combined, _ = generate_response(prompt)
+
+    outputs = {}
+    for t in requested:
+        match = re.search(
+            rf"###\s*{t.upper()}\s*\n(.*?)(?=\n###\s|\Z)", combined, re.DOTALL
+        )
+        outputs[t] = match.group(1).strip() if match else context
+    return outputs
+
+def compress_context(context: str, technique: str = 'summarize') -> str:
+    """Apply a compression technique to reduce token usage while preserving meaning.
+
+    Always requests the full technique triple: the fused prompt is then
+    identical whichever technique is asked for, so the first call pays one
+    LLM round trip and every subsequent technique swap on the same context
+    is served from the response cache.
+    """
+    if technique not in COMPRESSION_INSTRUCTIONS:
         return context
+    return compress_context_multi(context, list(COMPRESSION_INSTRUCTIONS))[technique]
 ```
 
 ---
@@ -300,19 +604,24 @@ captures all essential information:
 ## 8. Context Pruning: Deleting What Doesn't Help
 
 ```python
+# Compiled once at module scope; evaluate_response_quality runs in scoring
+# loops, so avoid re-compiling the score pattern on every call
+_SCORE_PATTERN = re.compile(r"(\d+\.\d+)")
+
 def evaluate_response_quality(prompt: str, response: str, criteria: List[str]) -> float:
     """Use the LLM to evaluate the quality of a response based on specific criteria."""
     criteria_list = "\n".join([f"- {c}" for c in criteria])
-    eval_prompt = f"""Rate the quality of the following response to a prompt. 
+    eval_prompt = f"""Rate the quality of the following response to a prompt.
 Prompt: {prompt}
 Response: {response}
 Evaluate based on these criteria:
 {criteria_list}
 Provide an overall score from 0.0 to 1.0."""
-    
+
     evaluation, _ = generate_response(eval_prompt)
     # Extract quality score from evaluation
-    return float(re.findall(r"(\d+\.\d+)", evaluation)[-1]) if re.findall(r"(\d+\.\d+)", evaluation) else 0.5
+    scores = _SCORE_PATTERN.findall(evaluation)
+    return float(scores[-1]) if scores else 0.5
 ```
 
 ---
@@ -320,27 +629,97 @@ Provide an overall score from 0.0 to 1.0."""
 ## 9. Context Expansion with Retrieval
 
 ```python
-def retrieve_relevant_info(query: str, knowledge_base: List[Dict[str, str]]) -> List[str]:
-    """Retrieve relevant information from a knowledge base based on a query."""
-    query_terms = set(query.lower().split())
-    relevant_info = []
-    
-    for item in knowledge_base:
-        content = item['content'].lower()
-        title = item['title'].lower()
-        
-        if any(term in content or term in title for term in query_terms):
-            relevant_info.append(item['content'])
-    
-    return relevant_info[:3]  # Return top 3 matches
-
-def create_rag_context(base_prompt: str, query: str, knowledge_base: List[Dict[str, str]]) -> str:
-    """Create a retrieval-augmented context by combining a base prompt with relevant information."""
+# Word extraction for indexing and querying. Plain split() would leave
+# punctuation attached ("warming." never matches "warming"), so both sides
+# tokenize with the same \w+ pattern.
+_WORD_PATTERN = re.compile(r"\w+")
+
+def build_inverted_index(knowledge_base: List[Dict[str, str]]) -> Dict[str, set]:
+    """Build a term -> item-index map so retrieval avoids rescanning every document.
+
+    Built once per knowledge base, this turns each query into a handful of
+    dictionary lookups instead of an O(items x terms) substring scan.
+    """
+    index: Dict[str, set] = {}
+    for i, item in enumerate(knowledge_base):
+        for term in _WORD_PATTERN.findall(f"{item['title']} {item['content']}".lower()):
+            index.setdefault(term, set()).add(i)
+    return index
+
+# Indexes keyed by knowledge-base identity, so repeated queries reuse them
+_kb_indexes: Dict[int, Dict[str, set]] = {}
+
+def retrieve_relevant_info(query: str, knowledge_base: List[Dict[str, str]], top_k: int = 3) -> List[str]:
+    """Retrieve the top-K most relevant items from a knowledge base for a query.
+
+    Items are ranked by how many distinct query terms they match; terms with
+    no postings are skipped, and a query matching nothing exits immediately.
+    """
+    index = _kb_indexes.get(id(knowledge_base))
+    if index is None:
+        index = _kb_indexes[id(knowledge_base)] = build_inverted_index(knowledge_base)
+
+    match_counts: Counter = Counter()
+    for term in set(_WORD_PATTERN.findall(query.lower())):
+        postings = index.get(term)
+        if postings:
+            match_counts.update(postings)
+
+    if not match_counts:
+        return []  # Early exit: no query term appears anywhere
+
+    # Heap-based top-K: no need to sort every candidate just to keep three.
+    # Ties break toward earlier knowledge-base entries.
+    top = heapq.nlargest(top_k, match_counts.items(), key=lambda kv: (kv[1], -kv[0]))
+    return [knowledge_base[i]['content'] for i, _ in top]
+
+# Per-entry token counts, batch-tokenized once per knowledge base and
+# memoized — budgeting a RAG context then costs dictionary lookups, not a
+# fresh tokenizer pass over every retrieved document
+_kb_token_counts: Dict[int, Dict[str, int]] = {}
+
+def get_kb_token_counts(knowledge_base: List[Dict[str, str]]) -> Dict[str, int]:
+    """Return (and cache) a content -> token-count map for a knowledge base."""
+    counts = _kb_token_counts.get(id(knowledge_base))
+    if counts is None:
+        contents = [item['content'] for item in knowledge_base]
+        counts = dict(zip(contents, count_tokens_batch(contents)))
+        _kb_token_counts[id(knowledge_base)] = counts
+    return counts
+
+def create_rag_context(
+    base_prompt: str,
+    query: str,
+    knowledge_base: List[Dict[str, str]],
+    max_info_tokens: Optional[int] = None
+) -> str:
+    """Create a retrieval-augmented context by combining a base prompt with relevant information.
+
+    If max_info_tokens is set, retrieved entries are included until the
+    budget is spent, using the memoized per-entry token counts.
+    """
     relevant_info = retrieve_relevant_info(query, knowledge_base)
-    
+
     if not relevant_info:
         return base_prompt
-    
+
+    if max_info_tokens is not None:
+        token_counts = get_kb_token_counts(knowledge_base)
+        budgeted = []
+        remaining = max_info_tokens
+        for info in relevant_info:
+            # Retrieved entries are always KB contents, so the memoized map
+            # covers them; dict.get with a count_tokens default would
+            # re-tokenize eagerly on every iteration
+            cost = token_counts[info]
+            if cost > remaining:
+                break
+            budgeted.append(info)
+            remaining -= cost
+        relevant_info = budgeted
+        if not relevant_info:
+            return base_prompt
+
     context_block = "Relevant information:\n\n" + "\n\n".join(relevant_info)
     return f"{base_prompt}\n\n{context_block}"
 ```